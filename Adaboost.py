@@ -7,6 +7,7 @@ class dec_stump:
         self.f_idx = None
         self.threshold = None
         self.alpha = None
+        self.error = None
 
     def predict(self, X):
         s1 = X.shape[0]
@@ -20,58 +21,209 @@ class dec_stump:
         return predictions
 
 
+class multi_stump:
+    # stump over K classes: samples with x < threshold take the left output,
+    # a class code for SAMME or a row of class log-probabilities for SAMME.R
+    def __init__(self):
+        self.f_idx = None
+        self.threshold = None
+        self.left = None
+        self.right = None
+        self.alpha = None
+        self.error = None
+
+    def predict(self, X):
+        go_left = X[:, self.f_idx] < self.threshold
+        if np.ndim(self.left) == 0:
+            return np.where(go_left, self.left, self.right)
+        return np.where(go_left[:, None], self.left, self.right)
+
+
+def sorted_features(X):
+    # sort orders do not depend on the weights, so they are found once per fit;
+    # rows are features so every cumulative sum runs over contiguous memory
+    order = np.argsort(X.T, axis=1, kind="stable")
+    X_sorted = np.take_along_axis(X.T, order, axis=1)
+    # first sorted position of every unique value of a feature
+    is_start = np.ones(X_sorted.shape, dtype=bool)
+    is_start[:, 1:] = X_sorted[:, 1:] != X_sorted[:, :-1]
+    return order, X_sorted, np.nonzero(is_start)
+
+
 class Adaboost:
-    def __init__(self, k):
+    def __init__(self, k, algorithm="binary"):
         self.k = k
+        # "binary" boosts dec_stump on -1/1 labels, "SAMME" and "SAMME.R"
+        # boost one multi_stump sequence over any number of classes
+        self.algorithm = algorithm
         self.clfs = []
 
     def fit(self, X, y):
+        if self.algorithm not in ("binary", "SAMME", "SAMME.R"):
+            raise ValueError("unknown algorithm: %r" % (self.algorithm,))
+        if self.algorithm != "binary":
+            return self._fit_multiclass(X, y)
+
         s1, n_features = X.shape
 
         w = np.full(s1, (1 / s1))
 
         self.clfs = []
 
+        order, X_sorted, starts = sorted_features(X)
+
         for x in range(self.k):
-            clf = dec_stump()
-            min_error = float("inf")
+            clf = self._best_stump(X, y, w, order, X_sorted, starts)
 
-            for feature_i in range(n_features):
-                x_col = X[:, feature_i]
-                thresholds = np.unique(x_col)
+            EPS = 1e-10
+            min_error = clf.error
+            clf.alpha = 0.5 * np.log((1.0 - min_error + EPS) / (min_error + EPS))
+            predictions = clf.predict(X)
+            w *= np.exp(-clf.alpha * y * predictions)
+            w /= np.sum(w)
+            self.clfs.append(clf)
 
-                for threshold in thresholds:
-                    p = 1
-                    predictions = np.ones(s1)
-                    predictions[x_col < threshold] = -1
+    def _best_stump(self, X, y, w, order, X_sorted, starts):
+        # a threshold t predicts -1 below t and 1 from t on, so its error is the
+        # weight of non -1 labels before t plus the weight of non 1 labels after
+        s1 = X.shape[0]
+        below = np.zeros((X.shape[1], s1 + 1))
+        np.cumsum((w * (y != -1))[order], axis=1, out=below[:, 1:])
+        from_on = np.zeros((X.shape[1], s1 + 1))
+        np.cumsum((w * (y != 1))[order], axis=1, out=from_on[:, 1:])
+        feat, pos = starts
+        errors = below[feat, pos] + (from_on[feat, -1] - from_on[feat, pos])
+        errors = np.where(errors > 0.5, 1 - errors, errors)
+
+        # the cumulative sums round differently from summing the misclassified
+        # weights directly, so near-best candidates are re-scored that way and
+        # visited in feature and threshold order to pick the same stump
+        near = errors <= errors.min() + 1e-9
+        clf = dec_stump()
+        min_error = float("inf")
+        for feature_i, p_i in zip(feat[near], pos[near]):
+            threshold = X_sorted[feature_i, p_i]
+            x_col = X[:, feature_i]
+            p = 1
+            predictions = np.ones(s1)
+            predictions[x_col < threshold] = -1
+
+            misc = w[y != predictions]
+            e1 = sum(misc)
+
+            if e1 > 0.5:
+                e1 = 1 - e1
+                p = -1
+
+            if e1 < min_error:
+                clf.polarity = p
+                clf.threshold = threshold
+                clf.f_idx = feature_i
+                min_error = e1
+
+        clf.error = min_error
+        return clf
+
+    def _fit_multiclass(self, X, y):
+        self.classes_, y_codes = np.unique(y, return_inverse=True)
+        n_classes = len(self.classes_)
+        s1 = X.shape[0]
 
-                    misc = w[y != predictions]
-                    e1 = sum(misc)
+        w = np.full(s1, (1 / s1))
 
-                    if e1 > 0.5:
-                        e1 = 1 - e1
-                        p = -1
+        self.clfs = []
 
-                    if e1 < min_error:
-                        clf.polarity = p
-                        clf.threshold = threshold
-                        clf.f_idx = feature_i
-                        min_error = e1
+        order, X_sorted, starts = sorted_features(X)
+        feat, pos = starts
+        # number every (feature, unique value) pair in feature-major order and
+        # combine it with the class, so one weighted bincount per round gives
+        # the class weights of every candidate threshold
+        sorted_idx = np.zeros(X_sorted.shape, dtype=np.intp)
+        sorted_idx[feat, pos] = 1
+        sorted_idx = np.cumsum(sorted_idx).reshape(X_sorted.shape) - 1
+        value_idx = np.empty_like(sorted_idx)
+        np.put_along_axis(value_idx, order, sorted_idx, axis=1)
+        codes = (value_idx * n_classes + y_codes).ravel()
+        EPS = 1e-10
 
-            EPS = 1e-10
-            clf.alpha = 0.5 * np.log((1.0 - min_error + EPS) / (min_error + EPS))
-            predictions = clf.predict(X)
-            w *= np.exp(-clf.alpha * y * predictions)
+        for x in range(self.k):
+            clf = self._best_multi_stump(codes, w, n_classes, X_sorted, feat, pos)
+            # a stump no better than guessing adds nothing
+            if clf.error >= 1 - 1 / n_classes:
+                break
+
+            if self.algorithm == "SAMME":
+                clf.alpha = np.log((1.0 - clf.error + EPS) / (clf.error + EPS)) + np.log(
+                    n_classes - 1
+                )
+                w *= np.exp(clf.alpha * (clf.predict(X) != y_codes))
+            else:
+                # with y coded 1 for the true class and -1 / (K - 1) elsewhere,
+                # -(K - 1) / K * y . log p reduces to -h_true / (K - 1)
+                h = clf.predict(X)
+                w *= np.exp(-h[np.arange(s1), y_codes] / (n_classes - 1))
             w /= np.sum(w)
             self.clfs.append(clf)
 
+            if clf.error <= 0:
+                break
+
+    def _best_multi_stump(self, codes, w, n_classes, X_sorted, feat, pos):
+        # with the weighted majority class on each side of a threshold, the
+        # error is the weight left after both sides' majority class weight
+        n_features = X_sorted.shape[0]
+        counts = np.bincount(
+            codes, weights=np.tile(w, n_features), minlength=len(feat) * n_classes
+        ).reshape(-1, n_classes)
+        total = counts[feat == 0].sum(axis=0)
+        # weight strictly below each threshold, restarted for every feature
+        left = np.cumsum(counts, axis=0) - counts
+        left -= left[np.searchsorted(feat, feat)]
+        right = total - left
+        errors = 1 - (left.max(axis=1) + right.max(axis=1)) / total.sum()
+
+        i = np.argmin(errors)
+        clf = multi_stump()
+        clf.f_idx = feat[i]
+        clf.threshold = X_sorted[feat[i], pos[i]]
+        left_w, right_w = left[i], right[i]
+        min_error = errors[i]
+
+        # an empty side (threshold at the minimum) falls back to all samples
+        if not left_w.any():
+            left_w = total
+        if self.algorithm == "SAMME":
+            clf.left, clf.right = np.argmax(left_w), np.argmax(right_w)
+        else:
+            clf.left, clf.right = [
+                self._samme_r_output(side_w / side_w.sum()) for side_w in (left_w, right_w)
+            ]
+        clf.error = min_error
+        return clf
+
+    def _samme_r_output(self, proba):
+        # SAMME.R contribution (K - 1) * (log p_k - mean_j log p_j)
+        log_p = np.log(np.clip(proba, 1e-10, None))
+        return (len(proba) - 1) * (log_p - log_p.mean())
+
     def predict(self, X):
+        if self.algorithm != "binary":
+            return self._predict_multiclass(X)
         clf = [clf.alpha * clf.predict(X) for clf in self.clfs]
         ypred = np.sum(clf, axis=0)
         ypred = np.sign(ypred)
 
         return ypred
 
+    def _predict_multiclass(self, X):
+        scores = np.zeros((X.shape[0], len(self.classes_)))
+        for clf in self.clfs:
+            if self.algorithm == "SAMME":
+                scores[np.arange(X.shape[0]), clf.predict(X)] += clf.alpha
+            else:
+                scores += clf.predict(X)
+        return self.classes_[np.argmax(scores, axis=1)]
+
 
 if __name__ == "__main__":
     from sklearn.model_selection import train_test_split
@@ -108,8 +260,9 @@ if __name__ == "__main__":
             #Shuffle the dataset
             cancer_dataset = cancer_dataset.sample(frac=1)
             model = Adaboost(k)
-            X, y = cancer_dataset.iloc[:, 0:6].to_numpy(), cancer_dataset.iloc[:,6].to_numpy()
-            y[y == 0] = -1
+            X, y = cancer_dataset.iloc[:, 1:10].to_numpy(), cancer_dataset["decision"].to_numpy()
+            #Benign (2) / malignant (4) as -1 / 1
+            y = np.where(y == 4, 1, -1)
 
             #5-fold cross validation
             kf = KFold(n_splits=5)
@@ -148,9 +301,8 @@ if __name__ == "__main__":
             #Shuffle the dataset
             car_dataset = car_dataset.sample(frac=1)
             
-            model = Adaboost(k)
+            model = Adaboost(k, algorithm="SAMME")
             X, y = car_dataset.iloc[:, 0:6].to_numpy(), car_dataset.iloc[:,6].to_numpy()
-            y[y == 0] = -1
 
             #5-fold cross validation
             kf = KFold(n_splits=5)
@@ -182,9 +334,8 @@ if __name__ == "__main__":
         for i in range(10):
             #Shuffle the dataset
             ecoli_dataset = ecoli_dataset.sample(frac=1)
-            model = Adaboost(k)
-            X, y = ecoli_dataset.iloc[:, 0:6].to_numpy(), ecoli_dataset.iloc[:,6].to_numpy()
-            y[y == 0] = -1
+            model = Adaboost(k, algorithm="SAMME")
+            X, y = ecoli_dataset.iloc[:, 1:8].to_numpy(), ecoli_dataset["decision"].to_numpy()
 
             #5-fold cross validation
             kf = KFold(n_splits=5)
@@ -202,16 +353,14 @@ if __name__ == "__main__":
     elif dataset == 'letter':
         #Preprocessing dataset
         letter_dataset = pd.read_csv('./data/letter-recognition.data', names=["lettr", "x-box", "y-box", "width", "high", "onpix", "x-bar", "y-bar", "x2bar", "y2bar", "xybar", "x2ybr", "xy2br", "x-ege", "xegvy", "y-ege", "yegvx"])
-        ObjectColumns = letter_dataset.select_dtypes(include=np.object).columns.tolist()
         letter_dataset['lettr'] = [ord(item)-64 for item in letter_dataset['lettr']]
 
         for i in range(10):
             #Shuffle the dataset
             letter_dataset = letter_dataset.sample(frac=1)
             
-            model = Adaboost(k)
-            X, y = letter_dataset.iloc[:, 0:6].to_numpy(), letter_dataset.iloc[:,6].to_numpy()
-            y[y == 0] = -1
+            model = Adaboost(k, algorithm="SAMME")
+            X, y = letter_dataset.iloc[:, 1:17].to_numpy(), letter_dataset["lettr"].to_numpy()
 
             #5-fold cross validation
             kf = KFold(n_splits=5)
@@ -267,8 +416,9 @@ if __name__ == "__main__":
             mushroom_dataset = mushroom_dataset.sample(frac=1)
             
             model = Adaboost(k)
-            X, y = mushroom_dataset.iloc[:, 0:6].to_numpy(), mushroom_dataset.iloc[:,6].to_numpy()
-            y[y == 0] = -1
+            X, y = mushroom_dataset.iloc[:, 1:23].to_numpy(), mushroom_dataset["decision"].to_numpy()
+            #Edible (e) / poisonous (p) as -1 / 1
+            y = np.where(y == 15, 1, -1)
 
             #5-fold cross validation
             kf = KFold(n_splits=5)
@@ -1,12 +1,45 @@
-from collections import Counter
 import numpy as np
 
-def entropy(y):
-    hist = np.bincount(y)
-    ps = hist / len(y)
+def entropy(y, w=None):
+    hist = np.bincount(y, weights=w)
+    ps = hist / (len(y) if w is None else np.sum(w))
     return -np.sum([p * np.log2(p) for p in ps if p > 0])
 
+def _entropies(counts, n):
+    # row-wise entropy of a (n_thresholds, n_classes) count matrix
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ps = counts / n[:, None]
+        plogp = np.where(ps > 0, ps * np.log2(np.where(ps > 0, ps, 1)), 0.0)
+    return -np.sum(plogp, axis=1)
+
+def check_random_state(seed):
+    # None uses the global np.random state, an int seeds a fresh RandomState
+    if seed is None:
+        return np.random
+    if isinstance(seed, np.random.RandomState):
+        return seed
+    return np.random.RandomState(seed)
+
+def bin_features(X, max_bins=255):
+    # quantize every column into at most max_bins uint8 codes; a code b means
+    # x <= edges[b], so a split "code <= b" is the raw split "x <= edges[b]"
+    if not 1 <= max_bins <= 255:
+        raise ValueError("max_bins must be between 1 and 255")
+    X_binned = np.empty(X.shape, dtype=np.uint8)
+    bin_edges = []
+    for feat_idx in range(X.shape[1]):
+        X_column = X[:, feat_idx]
+        edges = np.unique(X_column)
+        if len(edges) > max_bins:
+            qs = np.linspace(0, 1, max_bins + 1)[1:]
+            edges = np.unique(np.quantile(X_column, qs, method="inverted_cdf"))
+        X_binned[:, feat_idx] = np.searchsorted(edges, X_column, side="left")
+        bin_edges.append(edges)
+    return X_binned, bin_edges
+
 class Node:
+    __slots__ = ("feature", "threshold", "left", "right", "value")
+
     def __init__(
         self, feature=None, threshold=None, left=None, right=None, *, value=None
     ):
@@ -20,22 +53,108 @@ class Node:
         return self.value is not None
 
 class DecisionTree:
-    def __init__(self, min_samples_split=2, max_depth=100, n_feats=None):
+    def __init__(
+        self,
+        min_samples_split=2,
+        max_depth=100,
+        n_feats=None,
+        split_search="sorted",
+        max_bins=255,
+        random_state=None,
+    ):
         self.min_samples_split = min_samples_split
         self.max_depth = max_depth
         self.n_feats = n_feats
+        # "sorted" sweeps cumulative class counts once per feature,
+        # "exhaustive" re-partitions the column for every threshold,
+        # "histogram" searches per-node bin x class counts of binned features
+        self.split_search = split_search
+        self.max_bins = max_bins
+        self.random_state = random_state
         self.root = None
 
-    def fit(self, X, y):
+    def fit(self, X, y, sample_weight=None):
+        # sample_weight holds per-row multiplicities such as bootstrap counts;
+        # the tree only indexes into X and never copies rows of it
+        if self.split_search not in ("sorted", "exhaustive", "histogram"):
+            raise ValueError("unknown split_search: %r" % (self.split_search,))
+        if self.split_search == "histogram":
+            X_binned, bin_edges = bin_features(X, self.max_bins)
+            return self.fit_binned(X_binned, y, bin_edges, sample_weight)
+        self._rng = check_random_state(self.random_state)
         self.n_feats = X.shape[1] if not self.n_feats else min(self.n_feats, X.shape[1])
-        self.root = self._grow_tree(X, y)
+        idxs, w = self._weighted_rows(y, sample_weight)
+        self.root = self._grow_tree(X, y, idxs, w)
+        self._compile()
+
+    def fit_binned(self, X_binned, y, bin_edges, sample_weight=None):
+        # X_binned and bin_edges as returned by bin_features
+        self._rng = check_random_state(self.random_state)
+        self.n_feats = (
+            X_binned.shape[1]
+            if not self.n_feats
+            else min(self.n_feats, X_binned.shape[1])
+        )
+        self._bin_edges = bin_edges
+        self._n_bins = max(len(edges) for edges in bin_edges)
+        self._n_classes = np.max(y) + 1
+        idxs, w = self._weighted_rows(y, sample_weight)
+        hist = self._histogram(X_binned, y, idxs, w)
+        self.root = self._grow_tree_hist(X_binned, y, idxs, w, hist)
+        self._compile()
 
     def predict(self, X):
-        return np.array([self._traverse_tree(x, self.root) for x in X])
+        # move every sample one level down per step until all sit in leaves
+        node = np.zeros(X.shape[0], dtype=np.intp)
+        active = np.flatnonzero(self.node_feature[node] >= 0)
+        while active.size:
+            cur = node[active]
+            go_left = X[active, self.node_feature[cur]] <= self.node_threshold[cur]
+            node[active] = np.where(go_left, self.node_left[cur], self.node_right[cur])
+            active = active[self.node_feature[node[active]] >= 0]
+        return self.node_value[node]
+
+    def _weighted_rows(self, y, sample_weight):
+        if sample_weight is None:
+            return np.arange(len(y)), np.ones(len(y))
+        sample_weight = np.asarray(sample_weight, dtype=float)
+        idxs = np.flatnonzero(sample_weight)
+        return idxs, sample_weight[idxs]
+
+    def _compile(self):
+        # flatten the Node graph into parallel arrays, node 0 is the root and
+        # leaves have feature -1
+        features, thresholds, lefts, rights, values = [], [], [], [], []
+        stack = [(self.root, -1, False)]
+        while stack:
+            node, parent, is_left = stack.pop()
+            idx = len(features)
+            if parent >= 0:
+                (lefts if is_left else rights)[parent] = idx
+            lefts.append(-1)
+            rights.append(-1)
+            if node.is_leaf_node():
+                features.append(-1)
+                thresholds.append(0)
+                values.append(node.value)
+            else:
+                features.append(node.feature)
+                thresholds.append(node.threshold)
+                values.append(-1)
+                stack.append((node.right, idx, False))
+                stack.append((node.left, idx, True))
+        self.node_feature = np.array(features, dtype=np.intp)
+        self.node_threshold = np.array(thresholds)
+        self.node_left = np.array(lefts, dtype=np.intp)
+        self.node_right = np.array(rights, dtype=np.intp)
+        self.node_value = np.array(values)
 
-    def _grow_tree(self, X, y, depth=0):
-        n_samples, n_features = X.shape
-        n_labels = len(np.unique(y))
+    def _grow_tree(self, X, y, idxs, w, depth=0):
+        # idxs are the rows of X reaching this node, w their multiplicities
+        n_features = X.shape[1]
+        n_samples = np.sum(w)
+        y_node = y[idxs]
+        n_labels = len(np.unique(y_node))
 
         # stopping criteria
         if (
@@ -43,26 +162,151 @@ class DecisionTree:
             or n_labels == 1
             or n_samples < self.min_samples_split
         ):
-            leaf_value = self._most_common_label(y)
+            leaf_value = self._most_common_label(y_node, w)
             return Node(value=leaf_value)
 
-        feat_idxs = np.random.choice(n_features, self.n_feats, replace=False)
+        feat_idxs = self._rng.choice(n_features, self.n_feats, replace=False)
 
-        best_feat, best_thresh = self._best_criteria(X, y, feat_idxs)
+        best_feat, best_thresh = self._best_criteria(X, y_node, idxs, w, feat_idxs)
 
-        left_idxs, right_idxs = self._split(X[:, best_feat], best_thresh)
-        left = self._grow_tree(X[left_idxs, :], y[left_idxs], depth + 1)
-        right = self._grow_tree(X[right_idxs, :], y[right_idxs], depth + 1)
+        left_mask = X[idxs, best_feat] <= best_thresh
+        right_mask = ~left_mask
+        left = self._grow_tree(X, y, idxs[left_mask], w[left_mask], depth + 1)
+        right = self._grow_tree(X, y, idxs[right_mask], w[right_mask], depth + 1)
         return Node(best_feat, best_thresh, left, right)
 
-    def _best_criteria(self, X, y, feat_idxs):
+    def _histogram(self, X_binned, y, idxs, w):
+        # (n_features, n_bins, n_classes) weighted counts of the rows in idxs
+        n_features = X_binned.shape[1]
+        size = self._n_bins * self._n_classes
+        y_node = y[idxs]
+        hist = np.empty((n_features, size))
+        for feat_idx in range(n_features):
+            codes = X_binned[idxs, feat_idx].astype(np.intp) * self._n_classes + y_node
+            hist[feat_idx] = np.bincount(codes, weights=w, minlength=size)
+        return hist.reshape(n_features, self._n_bins, self._n_classes)
+
+    def _grow_tree_hist(self, X_binned, y, idxs, w, hist, depth=0):
+        n_features = X_binned.shape[1]
+        n_samples = np.sum(w)
+        class_counts = hist[0].sum(axis=0)
+        n_labels = np.count_nonzero(class_counts)
+
+        # stopping criteria
+        if (
+            depth >= self.max_depth
+            or n_labels == 1
+            or n_samples < self.min_samples_split
+        ):
+            leaf_value = np.argmax(class_counts) if n_samples else -1
+            return Node(value=leaf_value)
+
+        feat_idxs = self._rng.choice(n_features, self.n_feats, replace=False)
+
+        best_feat, best_bin = self._best_criteria_hist(hist, class_counts, feat_idxs)
+
+        left_mask = X_binned[idxs, best_feat] <= best_bin
+        right_mask = ~left_mask
+        left_idxs, left_w = idxs[left_mask], w[left_mask]
+        right_idxs, right_w = idxs[right_mask], w[right_mask]
+        # count only the smaller child, the sibling is parent minus child
+        if len(left_idxs) <= len(right_idxs):
+            left_hist = self._histogram(X_binned, y, left_idxs, left_w)
+            right_hist = hist - left_hist
+        else:
+            right_hist = self._histogram(X_binned, y, right_idxs, right_w)
+            left_hist = hist - right_hist
+        left = self._grow_tree_hist(
+            X_binned, y, left_idxs, left_w, left_hist, depth + 1
+        )
+        right = self._grow_tree_hist(
+            X_binned, y, right_idxs, right_w, right_hist, depth + 1
+        )
+        return Node(best_feat, self._bin_edges[best_feat][best_bin], left, right)
+
+    def _best_criteria_hist(self, hist, class_counts, feat_idxs):
+        n = class_counts.sum()
+        ps = class_counts[class_counts > 0] / n
+        parent_entropy = -np.sum(ps * np.log2(ps))
+
+        best_gain = -1
+        split_idx, split_bin = None, None
+        for feat_idx in feat_idxs:
+            left = np.cumsum(hist[feat_idx], axis=0)
+            right = class_counts - left
+            n_l = left.sum(axis=1)
+            n_r = n - n_l
+            child_entropy = (n_l / n) * _entropies(left, n_l) + (n_r / n) * _entropies(
+                right, n_r
+            )
+            gains = parent_entropy - child_entropy
+            gains[n_r == 0] = 0
+            # only bins holding samples of this node are real thresholds
+            gains[hist[feat_idx].sum(axis=1) == 0] = -np.inf
+
+            i = np.argmax(gains)
+            if gains[i] > best_gain:
+                best_gain = gains[i]
+                split_idx = feat_idx
+                split_bin = i
+
+        return split_idx, split_bin
+
+    def _best_criteria(self, X, y, idxs, w, feat_idxs):
+        # y and w are aligned with idxs, the rows of X at this node
+        if self.split_search == "exhaustive":
+            return self._best_criteria_exhaustive(X, y, idxs, w, feat_idxs)
+
+        n = np.sum(w)
+        parent_entropy = entropy(y, w)
+        onehot = np.zeros((len(y), np.max(y) + 1))
+        onehot[np.arange(len(y)), y] = w
+        total = onehot.sum(axis=0)
+
+        scored = []
+        for feat_idx in feat_idxs:
+            X_column = X[idxs, feat_idx]
+            order = np.argsort(X_column, kind="stable")
+            x_sorted = X_column[order]
+            # last sorted position of every unique value
+            ends = np.flatnonzero(np.append(x_sorted[1:] != x_sorted[:-1], True))
+
+            left = np.cumsum(onehot[order], axis=0)[ends]
+            right = total - left
+            n_l = np.cumsum(w[order])[ends]
+            n_r = n - n_l
+            child_entropy = (n_l / n) * _entropies(left, n_l) + (n_r / n) * _entropies(
+                right, n_r
+            )
+            gains = parent_entropy - child_entropy
+            gains[n_r == 0] = 0
+            scored.append((feat_idx, x_sorted[ends], gains))
+
+        # gains that tie mathematically can differ in the last bits between the
+        # two paths, so near-best candidates are re-scored the reference way to
+        # keep the chosen split identical to the exhaustive search
+        max_gain = max(gains.max() for _, _, gains in scored)
+        best_gain = -1
+        split_idx, split_thresh = None, None
+        for feat_idx, thresholds, gains in scored:
+            X_column = X[idxs, feat_idx]
+            for threshold in thresholds[gains >= max_gain - 1e-9]:
+                gain = self._information_gain(y, X_column, threshold, w)
+                if gain > best_gain:
+                    best_gain = gain
+                    split_idx = feat_idx
+                    split_thresh = threshold
+
+        return split_idx, split_thresh
+
+    def _best_criteria_exhaustive(self, X, y, idxs, w, feat_idxs):
         best_gain = -1
         split_idx, split_thresh = None, None
         for feat_idx in feat_idxs:
-            X_column = X[:, feat_idx]
+            X_column = X[idxs, feat_idx]
             thresholds = np.unique(X_column)
             for threshold in thresholds:
-                gain = self._information_gain(y, X_column, threshold)
+                gain = self._information_gain(y, X_column, threshold, w)
 
                 if gain > best_gain:
                     best_gain = gain
@@ -71,17 +315,18 @@ class DecisionTree:
 
         return split_idx, split_thresh
 
-    def _information_gain(self, y, X_column, split_thresh):
-        parent_entropy = entropy(y)
+    def _information_gain(self, y, X_column, split_thresh, w):
+        parent_entropy = entropy(y, w)
 
         left_idxs, right_idxs = self._split(X_column, split_thresh)
 
         if len(left_idxs) == 0 or len(right_idxs) == 0:
             return 0
 
-        n = len(y)
-        n_l, n_r = len(left_idxs), len(right_idxs)
-        e_l, e_r = entropy(y[left_idxs]), entropy(y[right_idxs])
+        n = np.sum(w)
+        n_l, n_r = np.sum(w[left_idxs]), np.sum(w[right_idxs])
+        e_l = entropy(y[left_idxs], w[left_idxs])
+        e_r = entropy(y[right_idxs], w[right_idxs])
         child_entropy = (n_l / n) * e_l + (n_r / n) * e_r
 
         ig = parent_entropy - child_entropy
@@ -92,18 +337,9 @@ class DecisionTree:
         right_idxs = np.argwhere(X_column > split_thresh).flatten()
         return left_idxs, right_idxs
 
-    def _traverse_tree(self, x, node):
-        if node.is_leaf_node():
-            return node.value
-
-        if x[node.feature] <= node.threshold:
-            return self._traverse_tree(x, node.left)
-        return self._traverse_tree(x, node.right)
-
-    def _most_common_label(self, y):
-        counter = Counter(y)
+    def _most_common_label(self, y, w):
         most_common = -1
-        if len(counter) != 0:
-            most_common = counter.most_common(1)[0][0]
+        if len(y) != 0:
+            most_common = np.argmax(np.bincount(y, weights=w))
         return most_common
 
@@ -0,0 +1,267 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np, os, tempfile, time
+from sklearn.base import BaseEstimator as estimator, ClassifierMixin as mix, clone
+
+
+def entropy(counts):
+    counts = np.asarray(counts, dtype=float)
+    ps = counts[counts > 0] / counts.sum()
+    return -np.sum(ps * np.log2(ps))
+
+def _entropies(counts):
+    # row-wise entropy of a (n_rows, n_classes) count matrix, 0 for empty rows
+    n = counts.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ps = counts / n
+        plogp = np.where(ps > 0, ps * np.log2(np.where(ps > 0, ps, 1)), 0.0)
+    return -np.sum(plogp, axis=1)
+
+
+def quantile_cuts(x, n_bins):
+    # equal-frequency bins; a column with fewer distinct values gets fewer
+    qs = np.linspace(0, 1, n_bins + 1)[1:-1]
+    return np.unique(np.quantile(x, qs, method="inverted_cdf"))
+
+def mdl_cuts(x, y_codes, n_classes):
+    # Fayyad & Irani: split at the boundary with the lowest class entropy and
+    # recurse on both sides while the gain pays for the cut under the MDL
+    # criterion; cuts sit halfway between neighbouring values
+    order = np.argsort(x, kind="stable")
+    x, y_codes = x[order], y_codes[order]
+    onehot = np.zeros((len(x), n_classes))
+    onehot[np.arange(len(x)), y_codes] = 1
+    cuts = []
+    stack = [(0, len(x))]
+    while stack:
+        start, stop = stack.pop()
+        n = stop - start
+        left = np.cumsum(onehot[start:stop], axis=0)[:-1]
+        # only boundaries between distinct values are candidates
+        cand = np.flatnonzero(x[start + 1 : stop] != x[start : stop - 1])
+        if not cand.size:
+            continue
+        total = left[-1] + onehot[stop - 1]
+        n_left = cand + 1.0
+        ent_left = _entropies(left[cand])
+        ent_right = _entropies(total - left[cand])
+        cond = (n_left * ent_left + (n - n_left) * ent_right) / n
+        best = int(np.argmin(cond))
+        ent = entropy(total)
+        k = np.count_nonzero(total)
+        k_left = np.count_nonzero(left[cand[best]])
+        k_right = np.count_nonzero(total - left[cand[best]])
+        delta = np.log2(3.0 ** k - 2) - (k * ent - k_left * ent_left[best] - k_right * ent_right[best])
+        if ent - cond[best] <= (np.log2(n - 1) + delta) / n:
+            continue
+        i = start + cand[best]
+        cuts.append((x[i] + x[i + 1]) / 2.0)
+        stack += [(start, i + 1), (i + 1, stop)]
+    return np.sort(np.array(cuts, dtype=float))
+
+
+# ID3 on categorical attributes: every node splits on the attribute with the
+# highest information gain, with one branch per value seen at the node. Any
+# number of columns and classes; values are coded to integers at fit time.
+# discretize="quantile" or "mdl" first bins every numeric column with more
+# than n_bins distinct values, so continuous columns get a few branches
+# instead of one per distinct value
+class ID3(estimator, mix):
+
+    def __init__(self, discretize=None, n_bins=10):
+        self.discretize = discretize
+        self.n_bins = n_bins
+
+    def fit(self, X, y):
+        if self.discretize not in (None, "quantile", "mdl"):
+            raise ValueError("unknown discretize: %r" % (self.discretize,))
+        X = np.asarray(X)
+        self.classes_, y_codes = np.unique(y, return_inverse=True)
+        self.bin_edges_ = [None] * X.shape[1]
+        if self.discretize is not None and np.issubdtype(X.dtype, np.number):
+            for j in range(X.shape[1]):
+                x = X[:, j].astype(float)
+                if len(np.unique(x)) <= self.n_bins:
+                    continue
+                if self.discretize == "quantile":
+                    self.bin_edges_[j] = quantile_cuts(x, self.n_bins)
+                else:
+                    self.bin_edges_[j] = mdl_cuts(x, y_codes, len(self.classes_))
+            X = self._binned(X)
+        self.categories_ = []
+        X_codes = np.empty(X.shape, dtype=np.intp)
+        for j in range(X.shape[1]):
+            values, X_codes[:, j] = np.unique(X[:, j], return_inverse=True)
+            self.categories_.append(values)
+        # attribute j's values own rows offsets[j]:offsets[j + 1] of the
+        # contingency table, so one bincount counts every attribute at once
+        sizes = [len(values) for values in self.categories_]
+        self._offsets = np.concatenate(([0], np.cumsum(sizes)))
+        self._value_attr = np.repeat(np.arange(len(sizes)), sizes)
+        # every node owns a slice of one shared row index, which a split
+        # reorders in place so that each child's rows are contiguous
+        self.tree_ = self._grow(X_codes, y_codes, np.arange(len(y_codes)), 0, len(y_codes))
+        self._compile()
+        return self
+
+    def _grow(self, X_all, y_all, idxs, start, stop):
+        rows = idxs[start:stop]
+        y_codes = y_all[rows]
+        if np.all(y_codes == y_codes[0]):
+            return int(y_codes[0])
+        X_codes = X_all[rows]
+        class_counts = np.bincount(y_codes, minlength=len(self.classes_))
+        label = int(np.argmax(class_counts))
+
+        # only the values present at the node take part; attrs maps each to
+        # its column, so per-column sums are one weighted bincount
+        table = self._contingency(X_codes, y_codes)
+        value_counts = table.sum(axis=1)
+        seen = np.flatnonzero(value_counts)
+        attrs = self._value_attr[seen]
+        n_features = len(self.categories_)
+        n_branches = np.bincount(attrs, minlength=n_features)
+        # an attribute with a single value here cannot split the rows
+        if n_branches.max() < 2:
+            return label
+        weighted = value_counts[seen] * _entropies(table[seen])
+        gains = entropy(class_counts) - np.bincount(attrs, weights=weighted, minlength=n_features) / len(y_codes)
+        gains[n_branches < 2] = -np.inf
+        # exact ties go to the first column, as max() over the columns did
+        feature = int(np.flatnonzero(gains >= gains.max() - 1e-12)[0])
+
+        # counting sort of the slice by the feature's code; the value counts
+        # are the attribute's rows of the table, summed over the classes
+        codes = X_codes[:, feature]
+        idxs[start:stop] = rows[np.argsort(codes, kind="stable")]
+        sizes = value_counts[self._offsets[feature] : self._offsets[feature + 1]]
+        bounds = start + np.concatenate(([0], np.cumsum(sizes)))
+        children = {}
+        for code in np.flatnonzero(sizes):
+            children[int(code)] = self._grow(X_all, y_all, idxs, bounds[code], bounds[code + 1])
+        return {"feature": feature, "default": label, "children": children}
+
+    def _contingency(self, X_codes, y_codes):
+        n_classes = len(self.classes_)
+        rows = X_codes + self._offsets[:-1]
+        flat = (rows * n_classes + y_codes[:, None]).ravel()
+        table = np.bincount(flat, minlength=self._offsets[-1] * n_classes)
+        return table.reshape(-1, n_classes)
+
+    def _compile(self):
+        # flatten tree_ into parallel arrays, node 0 is the root and leaves
+        # have feature -1. An internal node's children are the slots
+        # child_start:child_start + n_values + 1 of child_table, one per code
+        # of its attribute and a last one for unseen values; codes that never
+        # reached the node lead to a fallback leaf holding its majority class
+        features, values, starts, table = [], [], [], []
+        stack = [(self.tree_, -1)]
+        while stack:
+            node, slot = stack.pop()
+            idx = len(features)
+            if slot >= 0:
+                table[slot] = idx
+            if not isinstance(node, dict):
+                features.append(-1)
+                values.append(node)
+                starts.append(-1)
+                continue
+            features += [node["feature"], -1]
+            values += [node["default"], node["default"]]
+            starts += [len(table), -1]
+            base = len(table)
+            table += [idx + 1] * (len(self.categories_[node["feature"]]) + 1)
+            for code, child in node["children"].items():
+                stack.append((child, base + code))
+        self.node_feature = np.array(features, dtype=np.intp)
+        self.node_value = np.array(values, dtype=np.intp)
+        self.node_child_start = np.array(starts, dtype=np.intp)
+        self.child_table = np.array(table, dtype=np.intp)
+
+    def _binned(self, X):
+        # code b of a binned column means x <= edges[b]
+        columns = [
+            X[:, j] if edges is None else np.searchsorted(edges, X[:, j], side="left")
+            for j, edges in enumerate(self.bin_edges_)
+        ]
+        return np.column_stack(columns)
+
+    def predict(self, X):
+        X = np.asarray(X)
+        if any(edges is not None for edges in self.bin_edges_):
+            X = self._binned(X)
+        X_codes = np.empty(X.shape, dtype=np.intp)
+        for j, values in enumerate(self.categories_):
+            pos = np.searchsorted(values, X[:, j]).clip(max=len(values) - 1)
+            # values never seen in training take the node's last slot
+            X_codes[:, j] = np.where(values[pos] == X[:, j], pos, len(values))
+        # move every row one level down per step until all sit in leaves
+        node = np.zeros(len(X), dtype=np.intp)
+        active = np.flatnonzero(self.node_feature[node] >= 0)
+        while active.size:
+            cur = node[active]
+            node[active] = self.child_table[self.node_child_start[cur] + X_codes[active, self.node_feature[cur]]]
+            active = active[self.node_feature[node[active]] >= 0]
+        return self.classes_[self.node_value[node]]
+
+
+def _fit_fold(model, X, y, train, test):
+    model = clone(model)
+    start = time.perf_counter()
+    model.fit(X[train], y[train])
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    pred = model.predict(X[test])
+    predict_time = time.perf_counter() - start
+    return fit_time, predict_time, np.mean(pred == y[test])
+
+# data of a pool worker, memory-mapped once per process
+_worker_data = {}
+
+def _init_worker(X_path, y_path, model, mmap_mode):
+    _worker_data["X"] = np.load(X_path, mmap_mode=mmap_mode, allow_pickle=True)
+    _worker_data["y"] = np.load(y_path, mmap_mode=mmap_mode, allow_pickle=True)
+    _worker_data["model"] = model
+
+def _fit_fold_worker(split):
+    return _fit_fold(_worker_data["model"], _worker_data["X"], _worker_data["y"], *split)
+
+def cross_validate(model, X, y, n_splits=5, n_repeats=10, n_jobs=1, random_state=None):
+    # repeated k-fold: every repeat shuffles the rows once and cuts them into
+    # n_splits folds as KFold does, and each fold is fitted exactly once.
+    # Returns one record per fold with its repeat, fold, fit_time,
+    # predict_time (seconds) and accuracy
+    X, y = np.asarray(X), np.asarray(y)
+    rng = np.random.RandomState(random_state)
+    splits = []
+    for r in range(n_repeats):
+        folds = np.array_split(rng.permutation(len(y)), n_splits)
+        for f, test in enumerate(folds):
+            splits.append((np.concatenate(folds[:f] + folds[f + 1 :]), test))
+
+    n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+    if not n_jobs or n_jobs == 1:
+        scores = [_fit_fold(model, X, y, train, test) for train, test in splits]
+    else:
+        # workers map the data from disk instead of receiving a pickled copy
+        # with every fold; object arrays cannot be mapped and are loaded
+        with tempfile.TemporaryDirectory() as tmp:
+            X_path = os.path.join(tmp, "X.npy")
+            y_path = os.path.join(tmp, "y.npy")
+            np.save(X_path, X)
+            np.save(y_path, y)
+            mmap_mode = None if X.dtype == object or y.dtype == object else "r"
+            with ProcessPoolExecutor(
+                max_workers=min(n_jobs, len(splits)),
+                initializer=_init_worker,
+                initargs=(X_path, y_path, model, mmap_mode),
+            ) as pool:
+                scores = list(pool.map(_fit_fold_worker, splits))
+
+    results = np.zeros(
+        len(splits),
+        dtype=[("repeat", int), ("fold", int), ("fit_time", float), ("predict_time", float), ("accuracy", float)],
+    )
+    results["repeat"] = np.repeat(np.arange(n_repeats), n_splits)
+    results["fold"] = np.tile(np.arange(n_splits), n_repeats)
+    results["fit_time"], results["predict_time"], results["accuracy"] = np.array(scores).T
+    return results
@@ -1,33 +1,625 @@
-from collections import Counter
-
-import numpy as np, pandas as pd, sys
+import numpy as np, pandas as pd, sys, copy
 from sklearn.model_selection import KFold 
 
 #Calculating euclidean distance for all training distances
 def euclidean_distance(x1, x2):
     return np.sqrt(np.sum((x1 - x2) ** 2))
 
+#Distance metrics. pairwise(A, B) gives the len(A) x len(B) matrix one
+#feature at a time, so memory stays at len(A) x len(B); paired(A, B) gives
+#the distance of matching (or broadcast) rows and is the exact value used to
+#rank neighbours; box_bound(gap) is the distance to a box from the per-feature
+#gaps outside it, or None when the metric cannot bound a box
+class _Metric:
+    def fit(self, X_train):
+        pass
+
+    def pairwise(self, A, B):
+        total = np.zeros((len(A), len(B)))
+        for j in range(A.shape[1]):
+            self._accumulate(total, self._term(A[:, j, None], B[None, :, j]))
+        return self._finish(total)
+
+    def paired(self, A, B):
+        return self._finish(self._reduce(self._term(A, B)))
+
+    def box_bound(self, gap):
+        return self._finish(self._reduce(self._term(gap, 0)))
+
+    def _accumulate(self, total, term):
+        total += term
+
+    def _reduce(self, terms):
+        return np.sum(terms, axis=-1)
+
+    def _finish(self, total):
+        return total
+
+
+class _Minkowski(_Metric):
+    def __init__(self, p=2):
+        self.p = p
+
+    def _term(self, a, b):
+        if self.p == 1:
+            return np.abs(a - b)
+        if self.p == 2:
+            return (a - b) ** 2
+        return np.abs(a - b) ** self.p
+
+    def _finish(self, total):
+        if self.p == 1:
+            return total
+        if self.p == 2:
+            return np.sqrt(total)
+        return total ** (1.0 / self.p)
+
+
+class _Chebyshev(_Metric):
+    def _term(self, a, b):
+        return np.abs(a - b)
+
+    def _accumulate(self, total, term):
+        np.maximum(total, term, out=total)
+
+    def _reduce(self, terms):
+        return np.max(terms, axis=-1)
+
+
+#Number of features that differ (overlap distance). With few distinct values
+#per feature the training rows are one-hot encoded into 64-bit words, and the
+#matching features of two rows are the popcount of the AND of their words
+class _Hamming(_Metric):
+    _train = _packed = None
+
+    def _term(self, a, b):
+        return a != b
+
+    def box_bound(self, gap):
+        return np.sum(gap > 0, axis=-1)
+
+    def fit(self, X_train):
+        self._train = X_train
+        self._values = [np.unique(X_train[:, j]) for j in range(X_train.shape[1])]
+        n_bits = sum(len(values) for values in self._values)
+        self._packed = None
+        if -(-n_bits // 64) < X_train.shape[1]:
+            self._packed = self._pack(X_train)
+
+    def _pack(self, X):
+        bits = []
+        for j, values in enumerate(self._values):
+            pos = np.searchsorted(values, X[:, j]).clip(max=len(values) - 1)
+            onehot = np.zeros((len(X), len(values)), dtype=bool)
+            seen = values[pos] == X[:, j]
+            onehot[np.flatnonzero(seen), pos[seen]] = True
+            bits.append(onehot)
+        bits = np.concatenate(bits, axis=1)
+        bits = np.pad(bits, ((0, 0), (0, -bits.shape[1] % 64)))
+        return np.packbits(bits, axis=1).view(np.uint64)
+
+    def pairwise(self, A, B):
+        if self._packed is None or B is not self._train:
+            return super().pairwise(A, B)
+        packed = self._pack(A)
+        matches = np.zeros((len(A), len(B)))
+        for w in range(packed.shape[1]):
+            matches += _popcount(packed[:, w, None] & self._packed[None, :, w])
+        return A.shape[1] - matches
+
+
+def _popcount(words):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    bytes_ = words[..., None].view(np.uint8)
+    return _BYTE_POPCOUNT[bytes_].sum(axis=-1)
+
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+#1 - cosine similarity; rows of zeros count as orthogonal to everything. Not
+#a metric, so it cannot be used with the spatial trees
+class _Cosine(_Metric):
+    def pairwise(self, A, B):
+        return 1 - (A @ B.T) / np.outer(self._norm(A), self._norm(B))
+
+    def paired(self, A, B):
+        return 1 - np.sum(A * B, axis=-1) / (self._norm(A) * self._norm(B))
+
+    def box_bound(self, gap):
+        return None
+
+    def _norm(self, A):
+        norm = np.sqrt(np.sum(A * A, axis=-1))
+        return np.where(norm > 0, norm, 1)
+
+#Binary space-partitioning tree over the training rows, stored as flat
+#arrays: node i covers rows idx[start[i]:end[i]] and has children left[i] and
+#right[i] (-1 for leaves)
+class _SpatialTree:
+    def __init__(self, X, leaf_size=40, metric=None):
+        self.X = X
+        self.metric = _Minkowski(2) if metric is None else metric
+        self.idx = np.arange(len(X))
+        start, end, left, right = [0], [len(X)], [-1], [-1]
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            lo, hi = start[node], end[node]
+            if hi - lo <= leaf_size:
+                continue
+            #Split at the median of the widest dimension
+            pts = self.idx[lo:hi]
+            dim = np.argmax(np.ptp(X[pts], axis=0))
+            mid = (hi - lo) // 2
+            self.idx[lo:hi] = pts[np.argpartition(X[pts, dim], mid)]
+            for child_lo, child_hi in ((lo, lo + mid), (lo + mid, hi)):
+                start.append(child_lo)
+                end.append(child_hi)
+                left.append(-1)
+                right.append(-1)
+                stack.append(len(start) - 1)
+            left[node], right[node] = len(start) - 2, len(start) - 1
+        self.start = np.array(start)
+        self.end = np.array(end)
+        self.left = np.array(left)
+        self.right = np.array(right)
+        self._build_bounds()
+
+    #k nearest rows of x ordered by distance, equal distances by row index
+    def query(self, x, k):
+        best_d = np.full(k, np.inf)
+        best_i = np.full(k, -1)
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._lower_bound(node, x) > best_d[-1]:
+                continue
+            if self.left[node] < 0:
+                pts = self.idx[self.start[node] : self.end[node]]
+                dist = self.metric.paired(self.X[pts], x)
+                cand_d = np.concatenate((best_d, dist))
+                cand_i = np.concatenate((best_i, pts))
+                keep = np.lexsort((cand_i, cand_d))[:k]
+                best_d, best_i = cand_d[keep], cand_i[keep]
+                continue
+            #Visit the nearer child first so the bound tightens early
+            near, far = self.left[node], self.right[node]
+            if self._lower_bound(near, x) > self._lower_bound(far, x):
+                near, far = far, near
+            stack.append(far)
+            stack.append(near)
+        return best_i
+
+
+class KDTree(_SpatialTree):
+    def _build_bounds(self):
+        self.lower = np.array(
+            [self.X[self.idx[s:e]].min(axis=0) for s, e in zip(self.start, self.end)]
+        )
+        self.upper = np.array(
+            [self.X[self.idx[s:e]].max(axis=0) for s, e in zip(self.start, self.end)]
+        )
+
+    #Distance from x to the node's bounding box
+    def _lower_bound(self, node, x):
+        gap = np.maximum(self.lower[node] - x, 0) + np.maximum(x - self.upper[node], 0)
+        return self.metric.box_bound(gap)
+
+
+class BallTree(_SpatialTree):
+    def _build_bounds(self):
+        self.centroid = np.array(
+            [self.X[self.idx[s:e]].mean(axis=0) for s, e in zip(self.start, self.end)]
+        )
+        self.radius = np.array(
+            [
+                np.max(self.metric.paired(self.X[self.idx[s:e]], c))
+                for s, e, c in zip(self.start, self.end, self.centroid)
+            ]
+        )
+
+    #Distance from x to the node's bounding ball
+    def _lower_bound(self, node, x):
+        return max(self.metric.paired(x, self.centroid[node]) - self.radius[node], 0)
+
+
+#Forest of random projection trees for approximate search. Every node splits
+#its rows at the median projection on the direction between two random rows;
+#all trees share flat node arrays and leaves are padded rows of members.
+#Splits leaving fewer than min_leaf rows on a side are made by position
+class RPForest:
+    def __init__(self, X, n_trees=10, leaf_size=40, rng=np.random, min_leaf=1):
+        self.X = X
+        normals, offsets, left, right, leaf = [], [], [], [], []
+        members = []
+        self.roots = []
+        for _ in range(n_trees):
+            self.roots.append(len(left))
+            stack = [(len(left), np.arange(len(X)))]
+            normals.append(np.zeros(X.shape[1]))
+            offsets.append(0.0)
+            left.append(-1)
+            right.append(-1)
+            leaf.append(-1)
+            while stack:
+                node, rows = stack.pop()
+                if len(rows) <= leaf_size:
+                    leaf[node] = len(members)
+                    members.append(rows)
+                    continue
+                a, b = rng.choice(rows, 2, replace=False)
+                normal = X[a] - X[b]
+                if not normal.any():
+                    normal = rng.normal(size=X.shape[1])
+                proj = X[rows] @ normal
+                offset = np.median(proj)
+                go_left = proj <= offset
+                #Ties at the median can leave one side (nearly) empty
+                n_left = np.count_nonzero(go_left)
+                if min(n_left, len(rows) - n_left) < min_leaf:
+                    go_left = np.arange(len(rows)) < len(rows) // 2
+                normals[node], offsets[node] = normal, offset
+                for side_rows in (rows[go_left], rows[~go_left]):
+                    stack.append((len(left), side_rows))
+                    normals.append(np.zeros(X.shape[1]))
+                    offsets.append(0.0)
+                    left.append(-1)
+                    right.append(-1)
+                    leaf.append(-1)
+                left[node], right[node] = len(left) - 2, len(left) - 1
+        self.normal = np.array(normals)
+        self.offset = np.array(offsets)
+        self.left = np.array(left)
+        self.right = np.array(right)
+        self.leaf = np.array(leaf)
+        width = max(len(rows) for rows in members)
+        self.members = np.full((len(members), width), -1)
+        for i, rows in enumerate(members):
+            self.members[i, : len(rows)] = rows
+
+    #Leaf of every query below the given start nodes, one level per step;
+    #also returns the nodes and split margins met on the way
+    def _descend(self, X, node):
+        node = node.copy()
+        path, margins = [], []
+        active = np.flatnonzero(self.leaf[node] < 0)
+        while active.size:
+            cur = node[active]
+            margin = np.einsum("ij,ij->i", X[active], self.normal[cur]) - self.offset[cur]
+            step_nodes = np.full(len(X), -1)
+            step_margins = np.full(len(X), np.inf)
+            step_nodes[active], step_margins[active] = cur, np.abs(margin)
+            path.append(step_nodes)
+            margins.append(step_margins)
+            node[active] = np.where(margin <= 0, self.left[cur], self.right[cur])
+            active = active[self.leaf[node[active]] < 0]
+        return node, path, margins
+
+    #Candidate rows for every query: its leaf in each tree plus, per tree, the
+    #leaves across the n_probes splits it passed closest to
+    def candidates(self, X, n_probes=0):
+        leaves = []
+        for root in self.roots:
+            node, path, margins = self._descend(X, np.full(len(X), root))
+            leaves.append(node)
+            if not path:
+                continue
+            path, margins = np.array(path), np.array(margins)
+            closest = np.argsort(margins, axis=0)[:n_probes]
+            for level in closest:
+                split = path[level, np.arange(len(X))]
+                valid = split >= 0
+                split[~valid] = root
+                #Start on the side the query did not take
+                went_left = (
+                    np.einsum("ij,ij->i", X, self.normal[split]) - self.offset[split] <= 0
+                )
+                other = np.where(went_left, self.right[split], self.left[split])
+                probe, _, _ = self._descend(X, np.where(valid, other, node))
+                leaves.append(np.where(valid, probe, node))
+        return np.concatenate([self.members[self.leaf[node]] for node in leaves], axis=1)
+
+
 #KNN implementation
 class KNN:
-    def __init__(self, k):
+    #Metric name -> factory taking the Minkowski order p
+    metrics = {
+        "euclidean": lambda p: _Minkowski(2),
+        "manhattan": lambda p: _Minkowski(1),
+        "minkowski": _Minkowski,
+        "chebyshev": lambda p: _Chebyshev(),
+        "hamming": lambda p: _Hamming(),
+        "cosine": lambda p: _Cosine(),
+    }
+
+    def __init__(
+        self,
+        k,
+        batch_size=512,
+        algorithm="brute",
+        leaf_size=40,
+        n_trees=10,
+        n_probes=0,
+        random_state=None,
+        metric="euclidean",
+        p=2,
+        store_dtype=None,
+        block_size=8192,
+    ):
         self.k = k
+        #Test rows per distance block, caps memory at batch_size x len(X_train)
+        self.batch_size = batch_size
+        #"brute", "kd_tree", "ball_tree", "auto" or "approximate"
+        self.algorithm = algorithm
+        self.leaf_size = leaf_size
+        #Approximate search only: more trees and probes raise recall and cost
+        self.n_trees = n_trees
+        self.n_probes = n_probes
+        self.random_state = random_state
+        #Name in KNN.metrics; p is the order of "minkowski"
+        self.metric = metric
+        self.p = p
+        #None keeps X_train as given; "float32", "float16" or "int8" (per
+        #feature linear quantization) shrink the stored training matrix
+        self.store_dtype = store_dtype
+        #Training rows per block when brute force streams through the store
+        self.block_size = block_size
 
-    #Fit the data
+    #Fit the data. X may also be the path of a .npy file, which is memory
+    #mapped so that several processes can share one copy of it
     def fit(self, X, y):
+        if self.algorithm not in ("brute", "kd_tree", "ball_tree", "auto", "approximate"):
+            raise ValueError("unknown algorithm: %r" % (self.algorithm,))
+        if self.metric not in self.metrics:
+            raise ValueError("unknown metric: %r" % (self.metric,))
+        if self.store_dtype not in (None, "float32", "float16", "int8"):
+            raise ValueError("unknown store_dtype: %r" % (self.store_dtype,))
+        if isinstance(X, str):
+            X = np.load(X, mmap_mode="r")
         self.X_train = X
-        self.y_train = y
+        self.y_train = np.asarray(y)
+        self._metric = self.metrics[self.metric](self.p)
+
+        #A vectorized scan beats per-query tree walks until the training set
+        #is large, and trees stop pruning well in many dimensions
+        algorithm = self.algorithm
+        if algorithm == "auto":
+            n_samples, n_features = np.shape(X)
+            algorithm = "kd_tree" if n_features <= 15 and n_samples >= 100000 else "brute"
+
+        #Brute force on a reduced or mapped store decodes one block at a time
+        #instead of holding a float64 copy; the other searches need the whole
+        #matrix, so they get it decoded from the store
+        self._store = self._encode(X)
+        if algorithm == "brute" and (self.store_dtype is not None or isinstance(X, np.memmap)):
+            self._X_train_f = self._train_sq = None
+        else:
+            self._X_train_f = self._decode(0, len(X))
+            self._train_sq = np.einsum("ij,ij->i", self._X_train_f, self._X_train_f)
+            self._metric.fit(self._X_train_f)
+        if algorithm in ("kd_tree", "ball_tree") and isinstance(self._metric, _Cosine):
+            raise ValueError("cosine distance is not a metric, use brute or approximate")
+        self._tree = self._forest = None
+        if algorithm == "kd_tree":
+            self._tree = KDTree(self._X_train_f, self.leaf_size, self._metric)
+        elif algorithm == "ball_tree":
+            self._tree = BallTree(self._X_train_f, self.leaf_size, self._metric)
+        elif algorithm == "approximate":
+            rng = np.random if self.random_state is None else np.random.RandomState(self.random_state)
+            #Every leaf keeps at least k rows: nodes above 2k rows are split,
+            #and a side left with fewer than k falls back to halving by position
+            self._forest = RPForest(
+                self._X_train_f, self.n_trees, max(self.leaf_size, 2 * self.k), rng, self.k
+            )
+
+    def _encode(self, X):
+        if self.store_dtype is None:
+            return X
+        if self.store_dtype != "int8":
+            return np.asarray(X, dtype=self.store_dtype)
+        #Each feature's range is cut into 256 equal steps; integer features
+        #take whole steps, so those spanning at most 256 values stay exact
+        self._low = np.min(X, axis=0).astype(float)
+        high = np.max(X, axis=0).astype(float)
+        self._scale = np.where(high > self._low, (high - self._low) / 255, 1)
+        if np.issubdtype(X.dtype, np.integer):
+            self._scale = np.maximum(np.ceil(self._scale), 1)
+        codes = np.empty(np.shape(X), dtype=np.int8)
+        for start in range(0, len(X), self.block_size):
+            block = np.asarray(X[start : start + self.block_size], dtype=float)
+            codes[start : start + self.block_size] = np.rint((block - self._low) / self._scale) - 128
+        return codes
+
+    def _decode(self, start, stop):
+        block = np.asarray(self._store[start:stop], dtype=float)
+        if self.store_dtype == "int8":
+            block = (block + 128) * self._scale + self._low
+        return block
 
     #Predict the data and return the K-nearest neighbour
     def predict(self, X):
-        y_pred = [self._predict(x) for x in X]
-        return np.array(y_pred)
-
-    def _predict(self, x):
-        distances = [euclidean_distance(x, x_train) for x_train in self.X_train]
-        idx = np.argsort(distances)[: self.k]
-        neighbors = [self.y_train[i] for i in idx]
-        most_common = Counter(neighbors).most_common(1)
-        return most_common[0][0]
+        y_pred = [
+            self._predict_batch(X[i : i + self.batch_size])
+            for i in range(0, len(X), self.batch_size)
+        ]
+        return np.concatenate(y_pred) if y_pred else np.array([])
+
+    def _predict_batch(self, X):
+        idx = self._kneighbors(X, min(self.k, len(self.X_train)))
+        return self._vote(self.y_train[idx])
+
+    #Share of the exact k nearest neighbours (brute force) that the configured
+    #search returns, averaged over the rows of X
+    def recall(self, X):
+        k = min(self.k, len(self.X_train))
+        hits = 0
+        for i in range(0, len(X), self.batch_size):
+            batch = X[i : i + self.batch_size]
+            found = self._kneighbors(batch, k)
+            exact = self._brute_kneighbors(batch, k)
+            hits += sum(len(np.intersect1d(a, b)) for a, b in zip(found, exact))
+        return hits / float(len(X) * k)
+
+    #Held-out accuracy for every k from 1 to k_max, from a single neighbour
+    #search per split: leave-one-out when n_folds is None, otherwise
+    #contiguous folds like KFold(n_folds)
+    def evaluate_k(self, X, y, k_max, n_folds=None):
+        X, y = np.asarray(X), np.asarray(y)
+        if n_folds is None:
+            #Each row is queried against all rows with one extra neighbour,
+            #then itself is dropped from its own list
+            splits = [(np.arange(len(X)), np.arange(len(X)))]
+            extra = 1
+        else:
+            folds = np.array_split(np.arange(len(X)), n_folds)
+            splits = [(np.concatenate(folds[:i] + folds[i + 1 :]), test) for i, test in enumerate(folds)]
+            extra = 0
+        #Every split must be able to score every k
+        n_neighbors = min(len(train) for train, _ in splits) - extra
+        if k_max > n_neighbors:
+            raise ValueError("k_max=%d exceeds the %d neighbours available" % (k_max, n_neighbors))
+        hits = np.zeros(k_max)
+        for train, test in splits:
+            model = copy.copy(self)
+            model.k = min(k_max + extra, len(train))
+            model.fit(X[train], y[train])
+            for i in range(0, len(test), self.batch_size):
+                rows = test[i : i + self.batch_size]
+                idx = model._kneighbors(X[rows], model.k)
+                if extra:
+                    keep = idx != rows[:, None]
+                    order = np.argsort(~keep, axis=1, kind="stable")[:, : model.k - 1]
+                    idx = np.take_along_axis(idx, order, axis=1)
+                pred = self._prefix_votes(y[train][idx])
+                hits[: pred.shape[1]] += (pred == y[rows][:, None]).sum(axis=0)
+        return hits / float(len(X))
+
+    def _kneighbors(self, X, k):
+        if self._tree is not None:
+            X_f = np.asarray(X, dtype=float)
+            return np.array([self._tree.query(x, k) for x in X_f]).reshape(-1, k)
+        if self._forest is not None:
+            return self._approximate_kneighbors(X, k)
+        return self._brute_kneighbors(X, k)
+
+    def _approximate_kneighbors(self, X, k):
+        X_f = np.asarray(X, dtype=float)
+        cand = np.sort(self._forest.candidates(X_f, self.n_probes), axis=1)
+        #Padding (-1) and rows found by several trees are dropped
+        dup = np.zeros(cand.shape, dtype=bool)
+        dup[:, 1:] = cand[:, 1:] == cand[:, :-1]
+        rows, pos = np.nonzero((cand >= 0) & ~dup)
+        cols = cand[rows, pos]
+        dist = self._metric.paired(X_f[rows], self._X_train_f[cols])
+        #Queries with fewer than k distinct candidates (a training set smaller
+        #than k) are searched exactly instead
+        counts = np.bincount(rows, minlength=len(X_f))
+        keep = counts[rows] >= k
+        neighbors = np.empty((len(X_f), k), dtype=np.intp)
+        neighbors[counts >= k] = self._k_smallest(rows[keep], cols[keep], dist[keep], k)
+        short = np.flatnonzero(counts < k)
+        if short.size:
+            neighbors[short] = self._brute_kneighbors(X_f[short], k)
+        return neighbors
+
+    def _brute_kneighbors(self, X, k):
+        if self._X_train_f is None:
+            return self._streamed_kneighbors(X, k)
+        if not self._is_euclidean():
+            #Block distances can round differently from the row-wise ones,
+            #so candidates near the k-th are re-measured like the other paths
+            X_f = np.asarray(X, dtype=float)
+            dist = self._metric.pairwise(X_f, self._X_train_f)
+            kth = np.partition(dist, k - 1, axis=1)[:, k - 1 : k]
+            rows, cols = np.nonzero(dist <= kth + 1e-9 * (np.abs(kth) + 1))
+            dist = self._metric.paired(X_f[rows], self._X_train_f[cols])
+            return self._k_smallest(rows, cols, dist, k)
+
+        #Squared distances of the whole block as |a|^2 - 2ab + |b|^2
+        X_f = np.asarray(X, dtype=float)
+        test_sq = np.einsum("ij,ij->i", X_f, X_f)
+        d2 = test_sq[:, None] - 2 * X_f @ self._X_train_f.T + self._train_sq
+        np.maximum(d2, 0, out=d2)
+
+        #The expansion is exact on integer data; on floats its rounding could
+        #reorder near-equal distances, so the candidates near the k-th one are
+        #re-measured directly before choosing the neighbours
+        kth = np.partition(d2, k - 1, axis=1)[:, k - 1 : k]
+        if np.issubdtype(np.asarray(X).dtype, np.integer) and np.issubdtype(
+            np.asarray(self.X_train).dtype, np.integer
+        ):
+            rows, cols = np.nonzero(d2 <= kth)
+            dist = d2[rows, cols]
+        else:
+            tol = 1e-9 * (test_sq[:, None] + self._train_sq.max())
+            rows, cols = np.nonzero(d2 <= kth + tol)
+            dist = np.sqrt(np.sum((X_f[rows] - self._X_train_f[cols]) ** 2, axis=1))
+        return self._k_smallest(rows, cols, dist, k)
+
+    def _streamed_kneighbors(self, X, k):
+        #Same selection as _brute_kneighbors, one training block at a time:
+        #a block's rows within tolerance of the running k-th smallest
+        #distance are re-measured and kept, and the k nearest are chosen from
+        #all kept rows at the end
+        X_f = np.asarray(X, dtype=float)
+        test_sq = np.einsum("ij,ij->i", X_f, X_f)[:, None]
+        best = np.full((len(X_f), k), np.inf)
+        found_rows, found_cols, found_dist = [], [], []
+        for start in range(0, len(self._store), self.block_size):
+            block = self._decode(start, start + self.block_size)
+            if self._is_euclidean():
+                block_sq = np.einsum("ij,ij->i", block, block)
+                dist = np.maximum(test_sq - 2 * X_f @ block.T + block_sq, 0)
+            else:
+                dist = self._metric.pairwise(X_f, block)
+            best = np.partition(np.hstack([best, dist]), k - 1, axis=1)[:, :k]
+            kth = best.max(axis=1)[:, None]
+            if self._is_euclidean():
+                tol = 1e-9 * (test_sq + block_sq.max())
+            else:
+                tol = 1e-9 * (np.abs(kth) + 1)
+            rows, cols = np.nonzero(dist <= kth + tol)
+            found_rows.append(rows)
+            found_cols.append(cols + start)
+            found_dist.append(self._metric.paired(X_f[rows], block[cols]))
+        return self._k_smallest(
+            np.concatenate(found_rows), np.concatenate(found_cols), np.concatenate(found_dist), k
+        )
+
+    def _is_euclidean(self):
+        return isinstance(self._metric, _Minkowski) and self._metric.p == 2
+
+    def _k_smallest(self, rows, cols, dist, k):
+        #k nearest of every row from a candidate list, ordered by distance and
+        #equal distances by training index
+        order = np.lexsort((cols, dist, rows))
+        rows, cols = rows[order], cols[order]
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        return cols[rank < k].reshape(-1, k)
+
+    def _vote(self, neighbors):
+        #Most common label per row; ties go to the label met first among the
+        #neighbours, as Counter.most_common does
+        n_rows, k = neighbors.shape
+        labels, codes = np.unique(neighbors, return_inverse=True)
+        flat = (codes.reshape(neighbors.shape) + np.arange(n_rows)[:, None] * len(labels)).ravel()
+        counts = np.bincount(flat, minlength=n_rows * len(labels))
+        first_seen = np.full(n_rows * len(labels), k)
+        np.minimum.at(first_seen, flat, np.tile(np.arange(k), n_rows))
+        score = (counts * (k + 1) - first_seen).reshape(n_rows, len(labels))
+        return labels[np.argmax(score, axis=1)]
+
+    def _prefix_votes(self, neighbors):
+        #_vote of neighbors[:, :k] for every k at once: column k - 1 holds the
+        #prediction of the k nearest, with running label counts along the row
+        n_rows, k_max = neighbors.shape
+        labels, codes = np.unique(neighbors, return_inverse=True)
+        onehot = codes.reshape(neighbors.shape)[:, :, None] == np.arange(len(labels))
+        counts = np.cumsum(onehot, axis=1)
+        first_seen = np.where(onehot.any(axis=1), np.argmax(onehot, axis=1), k_max)
+        score = counts * (k_max + 1) - first_seen[:, None, :]
+        return labels[np.argmax(score, axis=2)]
 
 
 if __name__ == "__main__":
@@ -1,103 +1,180 @@
-from random import randrange
-from math import sqrt,exp, pi
+from math import sqrt, pi
 import pandas as pd, numpy as np, sys
 
 
+# Per-class feature means and variances, fitted in one grouped pass; every
+# test row is scored against every class at once in log space, so the
+# product of many small densities cannot underflow. partial_fit adds chunks
+# to the running statistics and merge folds in a model fitted elsewhere,
+# both with Chan's pairwise update of counts, means and squared deviations
+class GaussianNB:
+    def __init__(self, var_smoothing=1e-9):
+        self.var_smoothing = var_smoothing
+
+    def fit(self, X, y):
+        self.classes_ = None
+        return self.partial_fit(X, y)
+
+    def partial_fit(self, X, y):
+        X = np.asarray(X, dtype=float)
+        classes, codes = np.unique(y, return_inverse=True)
+        onehot = codes == np.arange(len(classes))[:, None]
+        count = onehot.sum(axis=1)
+        mean = onehot @ X / count[:, None]
+        m2 = onehot @ (X - mean[codes]) ** 2
+        return self._combine(classes, count, mean, m2, X.shape[1])
+
+    def merge(self, other):
+        return self._combine(other.classes_, other.class_count_, other.theta_, other.m2_, other.theta_.shape[1])
+
+    def _combine(self, classes, count, mean, m2, n_features):
+        if getattr(self, "classes_", None) is None:
+            self.classes_ = np.array([], dtype=classes.dtype)
+            self.class_count_ = np.zeros(0, dtype=int)
+            self.theta_ = self.m2_ = np.zeros((0, n_features))
+        # both sides are spread over the union of their classes, with zero
+        # counts where a class is missing
+        all_classes = np.union1d(self.classes_, classes)
+        n_a, mean_a, m2_a = self._widen(all_classes, self.classes_, self.class_count_, self.theta_, self.m2_)
+        n_b, mean_b, m2_b = self._widen(all_classes, classes, count, mean, m2)
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        self.classes_ = all_classes
+        self.class_count_ = n
+        self.theta_ = mean_a + delta * (n_b / n)[:, None]
+        self.m2_ = m2_a + m2_b + delta ** 2 * (n_a * n_b / n)[:, None]
+        # sample variance as stdev() used; a class seen once has none
+        self.var_ = self.m2_ / np.maximum(n - 1, 1)[:, None]
+        return self
+
+    def _widen(self, all_classes, classes, *stats):
+        pos = np.searchsorted(all_classes, classes)
+        wide = list()
+        for stat in stats:
+            out = np.zeros((len(all_classes),) + stat.shape[1:], dtype=stat.dtype)
+            out[pos] = stat
+            wide.append(out)
+        return wide
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self._joint_log_likelihood(X), axis=1)]
+
+    def _joint_log_likelihood(self, X):
+        X = np.asarray(X, dtype=float)
+        # constant features get unit spread, as t_prob did; rounding in the
+        # means leaves them a variance of a few ulps, so anything up to
+        # var_smoothing of the largest variance counts as 0
+        floor = self.var_smoothing * self.var_.max()
+        sigma = np.sqrt(self.var_)
+        sigma[self.var_ <= floor] = 1
+        prior = np.log(self.class_count_ / float(self.class_count_.sum()))
+        jll = np.empty((len(X), len(self.classes_)))
+        for c in range(len(self.classes_)):
+            z = (X - self.theta_[c]) / sigma[c]
+            jll[:, c] = prior[c] - np.sum(np.log(sqrt(2 * pi) * sigma[c])) - 0.5 * np.sum(z * z, axis=1)
+        return jll
+
+
+# For discrete features: per-class counts of every feature value, with
+# Laplace smoothing, so scoring a row is a table lookup per feature. Values
+# never seen in training get the smoothed probability of a zero count.
+# partial_fit adds a chunk's counts to the tables, widened to the union of
+# the classes and values seen so far
+class CategoricalNB:
+    def __init__(self, alpha=1.0):
+        self.alpha = alpha
+
+    def fit(self, X, y):
+        self.classes_ = None
+        return self.partial_fit(X, y)
+
+    def partial_fit(self, X, y):
+        X = np.asarray(X)
+        classes, codes = np.unique(y, return_inverse=True)
+        if getattr(self, "classes_", None) is None:
+            self.classes_ = np.array([], dtype=classes.dtype)
+            self.class_count_ = np.zeros(0, dtype=int)
+            self.categories_ = [np.array([], dtype=X.dtype) for j in range(X.shape[1])]
+            self.category_count_ = [np.zeros((0, 0), dtype=int) for j in range(X.shape[1])]
+        all_classes = np.union1d(self.classes_, classes)
+        old_c = np.searchsorted(all_classes, self.classes_)
+        new_c = np.searchsorted(all_classes, classes)
+        class_count = np.zeros(len(all_classes), dtype=int)
+        class_count[old_c] += self.class_count_
+        class_count[new_c] += np.bincount(codes, minlength=len(classes))
+        for j in range(X.shape[1]):
+            values, x = np.unique(X[:, j], return_inverse=True)
+            counts = np.bincount(codes * len(values) + x, minlength=len(classes) * len(values))
+            all_values = np.union1d(self.categories_[j], values)
+            table = np.zeros((len(all_classes), len(all_values)), dtype=int)
+            table[np.ix_(old_c, np.searchsorted(all_values, self.categories_[j]))] += self.category_count_[j]
+            table[np.ix_(new_c, np.searchsorted(all_values, values))] += counts.reshape(len(classes), len(values))
+            self.categories_[j] = all_values
+            self.category_count_[j] = table
+        self.classes_ = all_classes
+        self.class_count_ = class_count
+        # the extra last column is the zero count of an unseen value
+        self.feature_log_prob_ = list()
+        for values, table in zip(self.categories_, self.category_count_):
+            counts = np.hstack((table, np.zeros((len(all_classes), 1))))
+            total = class_count + self.alpha * len(values)
+            self.feature_log_prob_.append(np.log(counts + self.alpha) - np.log(total)[:, None])
+        return self
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self._joint_log_likelihood(X), axis=1)]
+
+    def _joint_log_likelihood(self, X):
+        X = np.asarray(X)
+        prior = np.log(self.class_count_ / float(self.class_count_.sum()))
+        jll = np.tile(prior, (len(X), 1))
+        for j, values in enumerate(self.categories_):
+            pos = np.searchsorted(values, X[:, j]).clip(max=len(values) - 1)
+            pos[values[pos] != X[:, j]] = len(values)
+            jll += self.feature_log_prob_[j][:, pos].T
+        return jll
+
+
 def fit(dataset, nb, decision, *args):
-    data = cross_validation(dataset)
+    X, y, folds = cross_validation(dataset, decision)
     acc_list = list()
-    for index, unf_data in enumerate(data):
-        X_train = np.array(data)
-        X_train = np.delete(X_train, index, axis=0)
-        X_train = np.concatenate((X_train))
-        X_test = list()
-        for record in unf_data:
-            r = list(record)
-            X_test.append(r)
-            r[decision] = None
-        pred = nb(X_train, X_test, decision, *args)
-        y_test = [record[decision] for record in unf_data]
-        accuracy = acc_per(y_test, pred)
+    for test, train in folds:
+        pred = nb([X[s] for s in train], [y[s] for s in train], X[test], *args)
+        accuracy = acc_per(y[test], pred)
         acc_list.append(accuracy)
     return acc_list
 
-def naive_bayes_classifier(X_train, X_test, decision):
-    sort_data = cls_std(X_train, decision)
-    predictions = list()
-    for record in X_test:
-        res_prob = t_prob(
-            sort_data, record)
-        best_target_class, high_prob = None, -1
-        for target_value, probability in res_prob.items():
-            if best_target_class is None or probability > high_prob:
-                high_prob = probability
-                best_target_class = target_value
-        predictions.append(best_target_class)
-    return predictions
-
-
-def cross_validation(dataset):
-    num_of_folds = 5
-    aftr_crss = list()
-    temp_dataset = list(dataset)
-    datasize = int(len(dataset) / num_of_folds)
-    for f in range(num_of_folds):
-        fnl_fld_data = list()
-        while len(fnl_fld_data) < datasize:
-            index = randrange(len(temp_dataset))
-            fnl_fld_data.append(temp_dataset.pop(index))
-        aftr_crss.append(fnl_fld_data)
-    return aftr_crss
-
-
-def cls_std(dataset, decision):
-    dd_cls = dict()
-    for i in range(len(dataset)):
-        vector = dataset[i]
-        target_value = vector[decision]
-        if (target_value not in dd_cls):
-            dd_cls[target_value] = list()
-        dd_cls[target_value].append(vector)
-    result = dict()
-    for target_value, record in dd_cls.items():
-        value = [(mean(column), stdev(column), len(column))
-                           for column in zip(*record)]
-        del(value[decision])
-        result[target_value] = value
-    return result
-
-
-def t_prob(sort_data, row):
-    t_rows = sum([sort_data[label][0][2] for label in sort_data])
-    res_prob = dict()
-    for target_value, sorted_data in sort_data.items():
-        res_prob[target_value] = sort_data[target_value][0][2] / \
-            float(t_rows)
-        for i in range(len(sorted_data)):
-            mean, stdev, _ = sorted_data[i]
-            if stdev == 0.0:
-                stdev = 1
-            exponent = exp(-((row[i]-mean)**2 / (2 * stdev**2)))
-            prob = (1 / (sqrt(2 * pi) * stdev)) * exponent
-            res_prob[target_value] *= prob
-    return res_prob
+# X_train and y_train are lists of chunks, fed to the model one at a time
+def naive_bayes_classifier(X_train, y_train, X_test, model=GaussianNB):
+    nb = model()
+    for X_chunk, y_chunk in zip(X_train, y_train):
+        nb.partial_fit(X_chunk, y_chunk)
+    return nb.predict(X_test)
 
-def acc_per(actual, predicted):
-    correct = 0
-    for i in range(len(actual)):
-        if actual[i] == predicted[i]:
-            correct += 1
-    return correct / float(len(actual)) * 100.0
 
+# One shuffle of the rows into a contiguous feature matrix and label vector:
+# fold f is a slice of it, and its training rows are the slices before and
+# after that fold, so every fold is a few views rather than copied rows. As
+# before, the last len(dataset) % num_of_folds shuffled rows are left out
+def cross_validation(dataset, decision, num_of_folds=5):
+    dataset = np.asarray(dataset)
+    datasize = int(len(dataset) / num_of_folds)
+    end = datasize * num_of_folds
+    rows = np.random.permutation(len(dataset))[:end]
+    features = np.delete(np.arange(dataset.shape[1]), decision)
+    X = dataset[np.ix_(rows, features)]
+    y = dataset[rows, decision]
+    folds = list()
+    for f in range(num_of_folds):
+        start, stop = f * datasize, (f + 1) * datasize
+        train = [s for s in (slice(0, start), slice(stop, end)) if s.stop > s.start]
+        folds.append((slice(start, stop), train))
+    return X, y, folds
 
-def mean(numbers):
-    return sum(numbers)/float(len(numbers))
 
+def acc_per(actual, predicted):
+    return np.mean(np.asarray(actual) == np.asarray(predicted)) * 100.0
 
-def stdev(numbers):
-    avg = mean(numbers)
-    variance = sum([(x-avg)**2 for x in numbers]) / float(len(numbers)-1)
-    return sqrt(variance)
 
 if __name__ == "__main__":
 
@@ -128,7 +205,7 @@ if __name__ == "__main__":
         for i in range(10):
             decision = 6 
             accuracy = fit(car_dataset.values,
-                           naive_bayes_classifier, decision)            
+                           naive_bayes_classifier, decision, CategoricalNB)
             acc.append(accuracy)
         
 
@@ -199,9 +276,9 @@ if __name__ == "__main__":
         mushroom_dataset["habitat"] = mushroom_dataset['habitat'].astype(int)
 
         for i in range(10):
-            decision = 22  
+            decision = 0
             accuracy = fit(mushroom_dataset.values,
-                           naive_bayes_classifier, decision)
+                           naive_bayes_classifier, decision, CategoricalNB)
             acc.append(accuracy)
 
     elif dataset == 'ecoli':
@@ -209,6 +286,7 @@ if __name__ == "__main__":
         ecoli_dataset = pd.read_csv("./data/ecoli.data", names=["sequence names", "mcg", "gvh", "lip", "chg",
                                 "aac", "alm1", "alm2", "decision"], delim_whitespace=True)    
         ecoli_dataset["decision"].replace(["cp","im","imU","imS","imL","om","omL","pp"], [0,1,2,3,4,5,6,7], inplace = True)
+        ecoli_dataset = ecoli_dataset.drop("sequence names", axis="columns")
 
         ecoli_dataset['mcg'] = ecoli_dataset['mcg'].astype(float)
         ecoli_dataset['gvh'] = ecoli_dataset['gvh'].astype(float)
@@ -220,7 +298,7 @@ if __name__ == "__main__":
         ecoli_dataset['decision'] = ecoli_dataset['decision'].astype(int)
 
         for i in range(10):
-            decision = 7 
+            decision = 7
             accuracy = fit(ecoli_dataset.values,naive_bayes_classifier, decision)
             acc.append(accuracy)
 
@@ -229,11 +307,10 @@ if __name__ == "__main__":
     elif dataset == 'letter':
         #Preprocessing dataset
         letter_dataset = pd.read_csv('./data/letter-recognition.data', names=["lettr", "x-box", "y-box", "width", "high", "onpix", "x-bar", "y-bar", "x2bar", "y2bar", "xybar", "x2ybr", "xy2br", "x-ege", "xegvy", "y-ege", "yegvx"])
-        ObjectColumns = letter_dataset.select_dtypes(include=np.object).columns.tolist()
         letter_dataset['lettr'] = [ord(item)-64 for item in letter_dataset['lettr']]
 
         for i in range(10):
-            decision = 16  
+            decision = 0
             accuracy = fit(letter_dataset.values,
                            naive_bayes_classifier, decision)
             acc.append(accuracy)
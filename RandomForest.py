@@ -1,43 +1,188 @@
-from collections import Counter
-import numpy as np, pandas as pd, sys
-from DecisionTrees import DecisionTree
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np, pandas as pd, sys, os, tempfile
+from DecisionTrees import DecisionTree, bin_features, check_random_state
 
-def cl(y):
-    counter = Counter(y)
-    most_common = counter.most_common(1)[0][0]
-    return most_common
+def vote(tree_preds):
+    # majority label per column of a (n_trees, n_samples) matrix; ties go to
+    # the label seen first in tree order, as Counter.most_common does
+    n_trees, n_samples = tree_preds.shape
+    labels, codes = np.unique(tree_preds, return_inverse=True)
+    codes = codes.reshape(tree_preds.shape)
+    n_labels = len(labels)
+    flat = (codes + np.arange(n_samples) * n_labels).ravel()
+    counts = np.bincount(flat, minlength=n_samples * n_labels)
+    first_seen = np.full(n_samples * n_labels, n_trees)
+    np.minimum.at(first_seen, flat, np.repeat(np.arange(n_trees), n_samples))
+    score = counts * (n_trees + 1) - first_seen
+    return labels[np.argmax(score.reshape(n_samples, n_labels), axis=1)]
 
-def boot(X, y):
-    n_samples = X.shape[0]
-    idxs = np.random.choice(n_samples, n_samples, replace=True)
-    return X[idxs], y[idxs]
+def boot(n_samples, rng=np.random):
+    # bootstrap multiplicity of every row instead of a resampled copy
+    idxs = rng.choice(n_samples, n_samples, replace=True)
+    return np.bincount(idxs, minlength=n_samples)
+
+def _fit_tree(X, y, seed, tree_params, bin_edges=None):
+    # every tree draws its bootstrap and feature subsets from its own seed,
+    # so the forest is the same however the trees are spread over workers
+    rng = np.random.RandomState(seed)
+    tree = DecisionTree(random_state=rng, **tree_params)
+    counts = boot(len(y), rng)
+    if bin_edges is not None:
+        tree.fit_binned(X, y, bin_edges, sample_weight=counts)
+    else:
+        tree.fit(X, y, sample_weight=counts)
+    return tree
+
+# training data of a pool worker, memory-mapped once per process
+_worker_data = {}
+
+def _init_worker(X_path, y_path, tree_params, bin_edges):
+    _worker_data["X"] = np.load(X_path, mmap_mode="r")
+    _worker_data["y"] = np.load(y_path, mmap_mode="r")
+    _worker_data["tree_params"] = tree_params
+    _worker_data["bin_edges"] = bin_edges
+
+def _fit_tree_worker(seed):
+    return _fit_tree(
+        _worker_data["X"],
+        _worker_data["y"],
+        seed,
+        _worker_data["tree_params"],
+        _worker_data["bin_edges"],
+    )
 
 
 class RandomForest:
-    def __init__(self, n_trees=10, s_split=2, max_depth=100, n_feats=None):
+    def __init__(
+        self,
+        n_trees=10,
+        s_split=2,
+        max_depth=100,
+        n_feats=None,
+        split_search="sorted",
+        max_bins=255,
+        n_jobs=1,
+        random_state=None,
+        oob_score=False,
+        warm_start=False,
+    ):
         self.n_trees = n_trees
         self.s_split = s_split
         self.max_depth = max_depth
         self.n_feats = n_feats
+        self.split_search = split_search
+        self.max_bins = max_bins
+        # number of worker processes, -1 uses every core
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        # score every row with the trees whose bootstrap left it out
+        self.oob_score = oob_score
+        # keep the fitted trees on refit and only grow up to n_trees
+        self.warm_start = warm_start
         self.trees = []
+        self.tree_seeds = np.empty(0, dtype=int)
 
     def fit(self, X_arr, y_arr):
-        self.trees = []
-        for _ in range(self.n_trees):
-            tree = DecisionTree(
-                s_split=self.s_split,
-                max_depth=self.max_depth,
-                n_feats=self.n_feats,
+        if not self.warm_start:
+            self.trees = []
+            self.tree_seeds = np.empty(0, dtype=int)
+        n_fitted = len(self.trees)
+        if self.n_trees < n_fitted:
+            raise ValueError(
+                "n_trees=%d is smaller than the %d trees already fitted with "
+                "warm_start" % (self.n_trees, n_fitted)
             )
-            X_samp, y_samp = boot(X_arr, y_arr)
-            tree.fit(X_samp, y_samp)
-            self.trees.append(tree)
+
+        tree_params = dict(
+            min_samples_split=self.s_split,
+            max_depth=self.max_depth,
+            n_feats=self.n_feats,
+            split_search=self.split_search,
+            max_bins=self.max_bins,
+        )
+        self.classes_ = np.unique(y_arr)
+        X_train, bin_edges = X_arr, None
+        if self.split_search == "histogram":
+            # bin once for the whole forest, every tree indexes the uint8 matrix
+            X_train, bin_edges = bin_features(X_arr, self.max_bins)
+        rng = check_random_state(self.random_state)
+        # a fixed random_state yields the same seed prefix on every fit, so
+        # growing 10 -> 50 trees matches a cold fit of 50
+        seeds = rng.randint(np.iinfo(np.int32).max, size=self.n_trees)[n_fitted:]
+        if len(seeds):
+            self.trees = self.trees + self._fit_trees(
+                X_train, y_arr, seeds, tree_params, bin_edges
+            )
+            self.tree_seeds = np.append(self.tree_seeds, seeds)
+        if self.oob_score:
+            self._set_oob_score(X_arr, y_arr)
+
+    def _fit_trees(self, X_arr, y_arr, seeds, tree_params, bin_edges):
+        n_jobs = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+        if not n_jobs or n_jobs == 1:
+            return [
+                _fit_tree(X_arr, y_arr, seed, tree_params, bin_edges) for seed in seeds
+            ]
+
+        # workers map the training set from disk instead of receiving a
+        # pickled copy with every task
+        with tempfile.TemporaryDirectory() as tmp:
+            X_path = os.path.join(tmp, "X.npy")
+            y_path = os.path.join(tmp, "y.npy")
+            np.save(X_path, X_arr)
+            np.save(y_path, y_arr)
+            with ProcessPoolExecutor(
+                max_workers=min(n_jobs, len(seeds)),
+                initializer=_init_worker,
+                initargs=(X_path, y_path, tree_params, bin_edges),
+            ) as pool:
+                return list(pool.map(_fit_tree_worker, seeds))
+
+    def _set_oob_score(self, X_arr, y_arr):
+        # a tree's bootstrap is the first draw from its seed, so the rows it
+        # left out are recovered without keeping the counts around
+        n_samples, n_classes = len(y_arr), len(self.classes_)
+        votes = np.zeros((n_samples, n_classes))
+        for tree, seed in zip(self.trees, self.tree_seeds):
+            oob = np.flatnonzero(boot(n_samples, np.random.RandomState(seed)) == 0)
+            codes, known = self._class_codes(tree.predict(X_arr[oob]))
+            np.add.at(votes, (oob[known], codes[known]), 1)
+
+        n_votes = votes.sum(axis=1)
+        scored = n_votes > 0
+        # rows that were in every bootstrap have no out-of-bag estimate
+        with np.errstate(invalid="ignore"):
+            self.oob_decision_function_ = votes / n_votes[:, None]
+        oob_pred = self.classes_[np.argmax(votes[scored], axis=1)]
+        self.oob_score_ = np.mean(oob_pred == y_arr[scored])
 
     def predict(self, X):
-        tree_preds = np.array([tree.predict(X) for tree in self.trees])
-        tree_preds = np.swapaxes(tree_preds, 0, 1)
-        y_pred = [cl(tree_pred) for tree_pred in tree_preds]
-        return np.array(y_pred)
+        return vote(self._tree_predictions(X))
+
+    def predict_proba(self, X):
+        # fraction of trees voting for each label in self.classes_
+        tree_preds = self._tree_predictions(X)
+        n_classes = len(self.classes_)
+        codes, known = self._class_codes(tree_preds)
+        samples = np.broadcast_to(np.arange(tree_preds.shape[1]), tree_preds.shape)
+        flat = (codes + samples * n_classes)[known]
+        counts = np.bincount(flat, minlength=tree_preds.shape[1] * n_classes)
+        return counts.reshape(-1, n_classes) / len(self.trees)
+
+    def _class_codes(self, preds):
+        # position of each predicted label in self.classes_; empty leaves
+        # predict -1, which is not a class and is masked out by known
+        codes = np.searchsorted(self.classes_, preds).clip(max=len(self.classes_) - 1)
+        known = self.classes_[codes] == preds
+        return codes, known
+
+    def _tree_predictions(self, X):
+        n_jobs = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+        if not n_jobs or n_jobs == 1:
+            return np.array([tree.predict(X) for tree in self.trees])
+        # tree prediction is vectorized numpy work, threads avoid pickling X
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            return np.array(list(pool.map(lambda tree: tree.predict(X), self.trees)))
 
 if __name__ == "__main__":
     from sklearn.model_selection import train_test_split, KFold
@@ -70,26 +215,8 @@ if __name__ == "__main__":
         cancer_dataset['concave points'] = cancer_dataset['concave points'].astype(int)
         cancer_dataset['decision'] = cancer_dataset['decision'].astype(int)
 
-        for i in range(10):
-            #Shuffle the dataset
-            cancer_dataset = cancer_dataset.sample(frac=1)
-            
-            model = RandomForest(n_trees=20, max_depth=10)
-            X = cancer_dataset.drop(["id","decision"], axis = 1)
-            y = cancer_dataset.decision
-            X = X.to_numpy()
-            y = y.to_numpy()
-
-            #5-fold cross validation
-            kf = KFold(n_splits=5)
-            for train_index , test_index in kf.split(X):
-                X_train , X_test = X[train_index,:],X[test_index,:]
-                y_train , y_test = y[train_index] , y[test_index]
-        
-                model.fit(X_train,y_train)
-                pred_values = model.predict(X_test)
-        
-                acc.append(accuracy_score(pred_values , y_test))
+        X = cancer_dataset.drop(["id","decision"], axis = 1).to_numpy()
+        y = cancer_dataset.decision.to_numpy()
 
     elif dataset == 'car':
         #Preprocessing dataset
@@ -110,25 +237,8 @@ if __name__ == "__main__":
         car_dataset['safety'] = car_dataset['safety'].astype(int)
         car_dataset['decision'] = car_dataset['decision'].astype(int)
 
-        for i in range(10):
-            #Shuffle the dataset
-            car_dataset = car_dataset.sample(frac=1)
-            
-            X = car_dataset.drop(["decision"], axis = 1)
-            y = car_dataset.decision
-            X = X.to_numpy()
-            y = y.to_numpy()
-
-            #5-fold cross validation
-            kf = KFold(n_splits=5)
-            for train_index , test_index in kf.split(X):
-                X_train , X_test = X[train_index,:],X[test_index,:]
-                y_train , y_test = y[train_index] , y[test_index]
-                model = RandomForest(n_trees=20, max_depth=10)
-                model.fit(X_train,y_train)
-                pred_values = model.predict(X_test)
-        
-                acc.append(accuracy_score(pred_values , y_test))
+        X = car_dataset.drop(["decision"], axis = 1).to_numpy()
+        y = car_dataset.decision.to_numpy()
     
     elif dataset == 'ecoli':
         #Preprocessing dataset
@@ -145,53 +255,16 @@ if __name__ == "__main__":
         ecoli_dataset['alm2'] = ecoli_dataset['alm2'].astype(float)
         ecoli_dataset['decision'] = ecoli_dataset['decision'].astype(int)
         
-        for i in range(10):
-            #Shuffle the dataset
-            ecoli_dataset = ecoli_dataset.sample(frac=1)
-
-            X = ecoli_dataset.drop(["sequence names","decision"], axis=1).to_numpy()
-            y = ecoli_dataset.decision.to_numpy()
-
-            #5-fold cross validation
-            kf = KFold(n_splits=5)
-            for train_index, test_index in kf.split(X):
-                X_train, X_test = X[train_index, :], X[test_index, :]
-                y_train, y_test = y[train_index], y[test_index]
-
-                model = RandomForest(n_trees=20, max_depth=10)
-                model.fit(X_train,y_train)
-                pred_values = model.predict(X_test)
-        
-                acc.append(accuracy_score(pred_values , y_test))
-
+        X = ecoli_dataset.drop(["sequence names","decision"], axis=1).to_numpy()
+        y = ecoli_dataset.decision.to_numpy()
 
     elif dataset == 'letter':
         #Preprocessing dataset
         letter_dataset = pd.read_csv('./data/letter-recognition.data', names=["lettr", "x-box", "y-box", "width", "high", "onpix", "x-bar", "y-bar", "x2bar", "y2bar", "xybar", "x2ybr", "xy2br", "x-ege", "xegvy", "y-ege", "yegvx"])
-        ObjectColumns = letter_dataset.select_dtypes(include=np.object).columns.tolist()
         letter_dataset['lettr'] = [ord(item)-64 for item in letter_dataset['lettr']]
 
-        for i in range(10):
-            #Shuffle the dataset
-            letter_dataset = letter_dataset.sample(frac=1)
-            
-            model = RandomForest(n_trees=20, max_depth=10)
-            X = letter_dataset.drop(["lettr"], axis = 1)
-            y = letter_dataset.lettr
-            X = X.to_numpy()
-            y = y.to_numpy()
-
-            #5-fold cross validation
-            kf = KFold(n_splits=5)
-            for train_index , test_index in kf.split(X):
-                X_train , X_test = X[train_index,:],X[test_index,:]
-                y_train , y_test = y[train_index] , y[test_index]
-        
-                model.fit(X_train,y_train)
-                pred_values = model.predict(X_test)
-        
-                acc.append(accuracy_score(pred_values , y_test))
-
+        X = letter_dataset.drop(["lettr"], axis = 1).to_numpy()
+        y = letter_dataset.lettr.to_numpy()
     
     elif dataset == 'mushroom':
         #Preprocessing dataset
@@ -230,26 +303,34 @@ if __name__ == "__main__":
         mushroom_dataset["population"] = mushroom_dataset['population'].astype(int)
         mushroom_dataset["habitat"] = mushroom_dataset['habitat'].astype(int)
 
-        for i in range(10):
-            #Shuffle the dataset
-            mushroom_dataset = mushroom_dataset.sample(frac=1)
-            
-            model = RandomForest(trees=20, max_depth=10)
-            X = mushroom_dataset.drop(["decision"], axis = 1)
-            y = mushroom_dataset.decision
-            X = X.to_numpy()
-            y = y.to_numpy()
-
-            #5-fold cross validation
-            kf = KFold(n_splits=5)
-            for train_index , test_index in kf.split(X):
-                X_train , X_test = X[train_index,:],X[test_index,:]
-                y_train , y_test = y[train_index] , y[test_index]
-        
-                model.fit(X_train,y_train)
-                pred_values = model.predict(X_test)
-        
-                acc.append(accuracy_score(pred_values , y_test))
+        X = mushroom_dataset.drop(["decision"], axis = 1).to_numpy()
+        y = mushroom_dataset.decision.to_numpy()
+
+    #Out-of-bag accuracy needs one fit per repeat instead of five
+    oob = len(sys.argv) > 2 and sys.argv[2] == "oob"
+
+    for i in range(10):
+        #Shuffle the dataset
+        perm = np.random.permutation(len(y))
+        X, y = X[perm], y[perm]
+
+        if oob:
+            model = RandomForest(n_trees=20, max_depth=10, oob_score=True)
+            model.fit(X, y)
+            acc.append(model.oob_score_)
+            continue
+
+        #5-fold cross validation
+        kf = KFold(n_splits=5)
+        for train_index , test_index in kf.split(X):
+            X_train , X_test = X[train_index,:],X[test_index,:]
+            y_train , y_test = y[train_index] , y[test_index]
+
+            model = RandomForest(n_trees=20, max_depth=10)
+            model.fit(X_train,y_train)
+            pred_values = model.predict(X_test)
+
+            acc.append(accuracy_score(pred_values , y_test))
 
     std = np.std(acc)
 